@@ -1,33 +1,63 @@
-import formats.djuced
-import formats.rekordbox_xml
+import formats
 import argparse
 
-allowed_formats = ["djuced", "rekordboxxml"]
-parser_functions = {
-    "djuced": formats.djuced.parse_db,
-    "rekordboxxml": formats.rekordbox_xml.parse_db
-}
-writer_functions = {
-    "djuced": formats.djuced.write_db,
-    "rekordboxxml": formats.rekordbox_xml.write_db
-}
-
 parser = argparse.ArgumentParser()
 parser.add_argument("input")
 parser.add_argument("-o", "--output")
 parser.add_argument("-if", "--inputFormat")
 parser.add_argument("-of", "--outputFormat")
+parser.add_argument("--offset", type=float)
+parser.add_argument("--roundBpm", type=int)
+parser.add_argument("--snapshot", action="store_true")
+parser.add_argument("-w", "--watch", action="store_true")
+parser.add_argument("--interval", type=float, default=1)
+parser.add_argument("--debounce", type=float, default=2)
 
 args = parser.parse_args()
-if not args.outputFormat or args.outputFormat not in allowed_formats:
+if not args.outputFormat or not formats.has_format(args.outputFormat):
     print("invalid or no output format specified!")
     exit(1)
-if not args.inputFormat or args.inputFormat not in allowed_formats:
+if not args.inputFormat or not formats.has_format(args.inputFormat):
     print("invalid or no input format specified!")
     exit(1)
+if args.snapshot and args.inputFormat != "djuced":
+    print("snapshots can only be used with djuced input!")
+    exit(1)
+
+if args.watch:
+    if args.offset is not None or args.roundBpm is not None:
+        print("transforms can't be used in watch mode!")
+        exit(1)
+    import watch
+
+    print("Watching original database, press Ctrl+C to stop...")
+    watch.watch(
+        args.input,
+        args.inputFormat,
+        args.output,
+        args.outputFormat,
+        args.interval,
+        args.debounce,
+        args.snapshot,
+    )
+    exit(0)
 
 print("Parsing original database...")
-lib = parser_functions[args.inputFormat](args.input)
+if args.snapshot:
+    lib = formats.get_parser(args.inputFormat)(args.input, snapshot=True)
+else:
+    lib = formats.get_parser(args.inputFormat)(args.input)
+if args.offset is not None or args.roundBpm is not None:
+    # numpy is only needed for transforms, don't import it otherwise
+    import transforms
+
+    print("Transforming library...")
+    library_transforms = []
+    if args.offset is not None:
+        library_transforms.append(transforms.offset_positions(args.offset))
+    if args.roundBpm is not None:
+        library_transforms.append(transforms.round_bpm(args.roundBpm))
+    transforms.apply_transforms(lib, library_transforms)
 print("Writing new database...")
-writer_functions[args.outputFormat](args.output, lib)
+formats.get_writer(args.outputFormat)(args.output, lib)
 print("Finished!")
@@ -0,0 +1,88 @@
+import importlib
+
+# typing is slow to import, stick to built-in types to keep startup fast
+from collections.abc import Callable
+
+FORMATS = {
+    "djconv": "formats.djconv",
+    "djuced": "formats.djuced",
+    "rekordboxxml": "formats.rekordbox_xml",
+}
+"""The built-in formats, mapped to the module implementing them.
+
+Format modules are only imported once a parser or writer is requested,
+so a conversion only pays for the formats it actually uses.
+"""
+
+ENTRY_POINT_GROUP = "djconv.formats"
+"""Entry point group for formats provided by other packages.
+
+Each entry point's name is the format name, its value the module
+providing `parse_db` and `write_db`.
+"""
+
+_modules = {}
+
+
+def available_formats() -> list[str]:
+    """Get the names of all available formats.
+
+    This looks up the installed entry points, so it's slower than
+    `has_format` for built-in formats.
+
+    :returns: The names of all built-in and plugin formats.
+    """
+    return list(FORMATS) + [
+        entry_point.name
+        for entry_point in _entry_points()
+        if entry_point.name not in FORMATS
+    ]
+
+
+def has_format(name: str) -> bool:
+    """Check whether a format with the given name exists.
+
+    :param name: The format name.
+    """
+    if name in FORMATS:
+        return True
+    return any(entry_point.name == name for entry_point in _entry_points())
+
+
+def get_parser(name: str) -> Callable:
+    """Get the `parse_db` function of the given format.
+
+    :param name: The format name.
+    :raises KeyError: If there is no format with the given name.
+    """
+    return _load(name).parse_db
+
+
+def get_writer(name: str) -> Callable:
+    """Get the `write_db` function of the given format.
+
+    :param name: The format name.
+    :raises KeyError: If there is no format with the given name.
+    """
+    return _load(name).write_db
+
+
+def _load(name: str):
+    if name not in _modules:
+        if name in FORMATS:
+            _modules[name] = importlib.import_module(FORMATS[name])
+        else:
+            for entry_point in _entry_points():
+                if entry_point.name == name:
+                    _modules[name] = entry_point.load()
+                    break
+            else:
+                raise KeyError(name)
+    return _modules[name]
+
+
+def _entry_points():
+    # importlib.metadata is slow to import, only pay for it when needed
+    import importlib.metadata
+
+    return importlib.metadata.entry_points(group=ENTRY_POINT_GROUP)
@@ -1,7 +1,8 @@
 import structs
 import sqlite3
-from typing import List
+from typing import Callable, List
 import os
+import pathlib
 from datetime import datetime
 
 COLORS = [
@@ -18,6 +19,75 @@ COLORS = [
 """The hardcoded DJUCED cue point colors.
 """
 
+ORDER_STEP = 1024
+"""The gap between the order_in_list values of neighbouring playlist entries.
+Entries are numbered starting at ORDER_STEP.
+
+Gaps let single entries be inserted or moved without renumbering
+the rest of the playlist.
+"""
+
+
+SNAPSHOT_PAGES = 256
+"""The number of database pages to copy per step when taking a snapshot.
+"""
+
+SNAPSHOT_RESTARTS = 10
+"""How often taking a snapshot may restart because the DB changed.
+"""
+
+
+def create_snapshot(
+    fname: str, progress: Callable[[int, int, int], object] | None = None
+) -> sqlite3.Connection:
+    """Copy the DB into an in-memory DB using the SQLite online backup API.
+
+    The source is opened read-only and copied in steps of `SNAPSHOT_PAGES`
+    pages, so it's only locked briefly at a time and other programs can
+    keep writing to it. If it is changed during the copy, the copy restarts.
+    A DB that is written to continuously could keep the copy from ever
+    finishing, so it's given up after `SNAPSHOT_RESTARTS` restarts.
+
+    :param fname: The file name of the DB to copy.
+    :param progress: Called after each step with the status,
+        the number of remaining pages and the total number of pages.
+    :returns: A connection to the in-memory copy.
+    :raises sqlite3.OperationalError: If the copy restarted too often.
+    """
+    remaining_pages = None
+    restarts = 0
+
+    def check_progress(status: int, remaining: int, total: int):
+        nonlocal remaining_pages, restarts
+        # every successful step copies pages, so if there aren't fewer left,
+        # the copy started over
+        if (
+            status == sqlite3.SQLITE_OK
+            and remaining_pages is not None
+            and remaining >= remaining_pages
+        ):
+            restarts += 1
+            if restarts > SNAPSHOT_RESTARTS:
+                raise sqlite3.OperationalError(
+                    f"{fname} kept changing while taking a snapshot"
+                )
+        remaining_pages = remaining
+        if progress is not None:
+            progress(status, remaining, total)
+
+    source = sqlite3.connect(
+        pathlib.Path(fname).absolute().as_uri() + "?mode=ro", uri=True
+    )
+    snapshot = sqlite3.connect(":memory:")
+    try:
+        source.backup(snapshot, pages=SNAPSHOT_PAGES, progress=check_progress)
+    except BaseException:
+        snapshot.close()
+        raise
+    finally:
+        source.close()
+    return snapshot
+
 
 def get_starts(cursor: sqlite3.Cursor) -> dict:
     """Get the start position of each song from trackBeats.
@@ -27,12 +97,18 @@ def get_starts(cursor: sqlite3.Cursor) -> dict:
     :param cursor: The cursor to execute the query with.
     :returns: A dict of start times, indexed by the track file path.
     """
-    starts_res = cursor.execute("SELECT * FROM trackBeats")
-    start = starts_res.fetchone()
+    return starts_from_rows(cursor.execute("SELECT * FROM trackBeats"))
+
+
+def starts_from_rows(rows) -> dict:
+    """Get the start position of each song from rows of trackBeats.
+
+    :param rows: The rows, as returned by `SELECT * FROM trackBeats`.
+    :returns: A dict of start times, indexed by the track file path.
+    """
     starts = {}
-    while start is not None:
+    for start in rows:
         starts[start[1]] = start[2]
-        start = starts_res.fetchone()
     return starts
 
 
@@ -47,11 +123,20 @@ def get_cues(cursor: sqlite3.Cursor) -> tuple[dict, dict]:
     :returns: A dict of Cues indexed by the track file path,
         another dict of lists of Hot Cues indexed by the track file path.
     """
-    cues_res = cursor.execute("SELECT * FROM trackCues")
-    cue = cues_res.fetchone()
+    return cues_from_rows(cursor.execute("SELECT * FROM trackCues"))
+
+
+def cues_from_rows(rows) -> tuple[dict, dict]:
+    """Get the cue points for each track from rows of trackCues,
+    see `get_cues`.
+
+    :param rows: The rows, as returned by `SELECT * FROM trackCues`.
+    :returns: A dict of Cues indexed by the track file path,
+        another dict of lists of Hot Cues indexed by the track file path.
+    """
     cues = {}
     hot_cues = {}
-    while cue is not None:
+    for cue in rows:
         cue_struct = structs.CuePoint(
             name=cue[2],
             number=cue[3],
@@ -65,7 +150,6 @@ def get_cues(cursor: sqlite3.Cursor) -> tuple[dict, dict]:
             if cue[1] not in hot_cues:
                 hot_cues[cue[1]] = []
             hot_cues[cue[1]].append(cue_struct)
-        cue = cues_res.fetchone()
     return (cues, hot_cues)
 
 
@@ -92,43 +176,56 @@ def get_tracks(
     track_ids = {}
     while track is not None:
         track_ids[track[16]] = track[0]
-        tracks.append(
-            structs.Track(
-                id=track[0],
-                album=track[1],
-                albumartist=track[2],
-                artist=track[3],
-                bitrate=track[4],
-                comment=track[5],
-                composer=track[6],
-                cover_filepath=track[7],  # TODO test
-                title=track[8],
-                bpm=track[10],
-                tracknumber=track[12],
-                fname=track[16],
-                first_beat_position=starts[track[16]] if track[16] in starts else 0,
-                hot_cues=hot_cues[track[16]] if track[16] in hot_cues else [],
-                cue=cues[track[16]] if track[16] in cues else None,
-                key=int(track[18]) if track[18] != "" else 0,
-                genre=track[19],
-                filesize=track[20],
-                length=int(track[21]) if track[21] != "" else None,
-                last_modified=track[23],
-                # just say -01-01, we don't know the actual date
-                release_date=str(track[24]) + "-01-01",
-                play_count=track[25],
-                first_played=track[26],
-                last_played=track[27],
-                samplerate=track[32],
-            )
-        )
+        tracks.append(track_from_row(track, starts, hot_cues, cues))
         track = tracks_res.fetchone()
 
     return (tracks, track_ids)
 
 
+def track_from_row(
+    track: tuple, starts: dict, hot_cues: dict, cues: dict
+) -> structs.Track:
+    """Create a Track model from a row of tracks.
+
+    :param track: The row, as returned by `SELECT * FROM tracks`.
+    :param starts: The track start times, indexed by track file path.
+    :param hot_cues: The tracks' hot cues, indexed by track file path.
+    :param cues: The tracks' cue points, indexed by track file path.
+    :returns: The track.
+    """
+    return structs.Track(
+        id=track[0],
+        album=track[1],
+        albumartist=track[2],
+        artist=track[3],
+        bitrate=track[4],
+        comment=track[5],
+        composer=track[6],
+        cover_filepath=track[7],  # TODO test
+        title=track[8],
+        bpm=track[10],
+        tracknumber=track[12],
+        fname=track[16],
+        first_beat_position=starts[track[16]] if track[16] in starts else 0,
+        hot_cues=hot_cues[track[16]] if track[16] in hot_cues else [],
+        cue=cues[track[16]] if track[16] in cues else None,
+        key=int(track[18]) if track[18] != "" else 0,
+        genre=track[19],
+        filesize=track[20],
+        length=int(track[21]) if track[21] != "" else None,
+        last_modified=track[23],
+        # just say -01-01, we don't know the actual date
+        release_date=str(track[24]) + "-01-01",
+        play_count=track[25],
+        first_played=track[26],
+        last_played=track[27],
+        samplerate=track[32],
+    )
+
+
 def get_playlist_tracks(cursor: sqlite3.Cursor, track_ids: dict) -> dict:
-    """Get the IDs of all tracks in each playlist from playlists2.
+    """Get the IDs of all tracks in each playlist from playlists2,
+    sorted by their order_in_list.
 
     `track_ids` is used to map the track file path (which indexes it in playlist2)
     to its ID.
@@ -137,14 +234,26 @@ def get_playlist_tracks(cursor: sqlite3.Cursor, track_ids: dict) -> dict:
     :param track_ids: The track IDs, indexed by the track file path.
     :returns: A dict of lists of track IDs, indexed by the playlist name.
     """
-    playlist_tracks_res = cursor.execute("SELECT * FROM playlists2 WHERE type=3")
-    playlist_track = playlist_tracks_res.fetchone()
+    return playlist_tracks_from_rows(
+        cursor.execute(
+            "SELECT * FROM playlists2 WHERE type=3 ORDER BY order_in_list, rowid"
+        ),
+        track_ids,
+    )
+
+
+def playlist_tracks_from_rows(rows, track_ids: dict) -> dict:
+    """Get the IDs of all tracks in each playlist from rows of playlists2.
+
+    :param rows: The playlist entry rows of playlists2, in playlist order.
+    :param track_ids: The track IDs, indexed by the track file path.
+    :returns: A dict of lists of track IDs, indexed by the playlist name.
+    """
     playlist_track_ids = {}
-    while playlist_track is not None:
+    for playlist_track in rows:
         if playlist_track[0] not in playlist_track_ids:
             playlist_track_ids[playlist_track[0]] = []
         playlist_track_ids[playlist_track[0]].append(track_ids[playlist_track[2]])
-        playlist_track = playlist_tracks_res.fetchone()
     return playlist_track_ids
 
 
@@ -159,10 +268,23 @@ def get_playlists(
     :param playlist_track_ids: Dict of Lists of track IDs, indexed by the playlist name.
     :returns: A list of playlists.
     """
-    playlists_res = cursor.execute("SELECT * FROM playlists2 WHERE type=0")
-    playlist = playlists_res.fetchone()
+    return playlists_from_rows(
+        cursor.execute(
+            "SELECT * FROM playlists2 WHERE type=0 ORDER BY order_in_list, rowid"
+        ),
+        playlist_track_ids,
+    )
+
+
+def playlists_from_rows(rows, playlist_track_ids: dict) -> List[structs.Playlist]:
+    """Get the playlists from rows of playlists2.
+
+    :param rows: The playlist rows of playlists2, in playlist order.
+    :param playlist_track_ids: Dict of Lists of track IDs, indexed by the playlist name.
+    :returns: A list of playlists.
+    """
     playlists = []
-    while playlist is not None:
+    for playlist in rows:
         playlists.append(
             structs.Playlist(
                 name=playlist[0],
@@ -174,7 +296,6 @@ def get_playlists(
                 ),
             )
         )
-        playlist = playlists_res.fetchone()
     return playlists
 
 
@@ -184,12 +305,18 @@ def get_samples(cursor: sqlite3.Cursor) -> List[structs.Sample]:
     :param cursor: The cursor to execute the query with.
     :returns: A list of samples.
     """
-    samples_res = cursor.execute("SELECT * FROM samples")
-    sample = samples_res.fetchone()
+    return samples_from_rows(cursor.execute("SELECT * FROM samples"))
+
+
+def samples_from_rows(rows) -> List[structs.Sample]:
+    """Get the samples from rows of samples.
+
+    :param rows: The rows, as returned by `SELECT * FROM samples`.
+    :returns: A list of samples.
+    """
     samples = []
-    while sample is not None:
+    for sample in rows:
         samples.append(structs.Sample(sample[1]))
-        sample = samples_res.fetchone()
     return samples
 
 
@@ -467,6 +594,8 @@ def insert_playlists(
     For columns with unknown meaning, default values corresponding to
     the most common values in the test data are used.
 
+    Playlist entries are numbered in steps of `ORDER_STEP`.
+
     :param conn: The connection to execute the query with.
     :param cursor: The cursor to execute the query with.
     :param library: The library with playlists/tracks to insert.
@@ -478,15 +607,16 @@ def insert_playlists(
     playlists = []
     playlist_tracks = []
     for playlist in library.playlists:
-        # TODO: keep track sort order
-        sort_order = 0
         # assume "#" for path until we figure out what it means
         playlists.append((playlist.name, "", playlist.sort_order))
-        for track_id in playlist.track_ids:
+        for sort_order, track_id in enumerate(playlist.track_ids):
             playlist_tracks.append(
-                (playlist.name, track_fnames_by_id[track_id], sort_order)
+                (
+                    playlist.name,
+                    track_fnames_by_id[track_id],
+                    (sort_order + 1) * ORDER_STEP,
+                )
             )
-            sort_order += 1
 
     cursor.executemany("INSERT INTO playlists2 VALUES (?, '#', ?, ?, 0)", playlists)
     cursor.executemany(
@@ -495,6 +625,183 @@ def insert_playlists(
     conn.commit()
 
 
+class PlaylistEditor:
+    """Edits the entries of an existing playlist.
+
+    The playlist's entries are read once, afterwards each edit only writes
+    the rows it changes, see `ORDER_STEP`. Use one editor for many edits
+    to the same playlist, e.g. when syncing a large crate.
+
+    Changes aren't committed, call `conn.commit()` when done. The playlist
+    must not be changed through other means while the editor is used.
+    """
+
+    def __init__(
+        self, conn: sqlite3.Connection, cursor: sqlite3.Cursor, playlist_name: str
+    ):
+        """Read the playlist's entries.
+
+        :param conn: The connection to execute the queries with.
+        :param cursor: The cursor to execute the queries with.
+        :param playlist_name: The name of the playlist.
+        :raises KeyError: If there is no playlist with the given name.
+        """
+        self.conn = conn
+        self.cursor = cursor
+        self.playlist_name = playlist_name
+        playlist = cursor.execute(
+            "SELECT path FROM playlists2 WHERE type=0 AND name=?", (playlist_name,)
+        ).fetchone()
+        if playlist is None:
+            raise KeyError(playlist_name)
+        self.path = playlist[0]
+        # (rowid, order_in_list) of each entry, in playlist order
+        self.entries = cursor.execute(
+            (
+                "SELECT rowid, order_in_list FROM playlists2 "
+                "WHERE type=3 AND name=? ORDER BY order_in_list, rowid"
+            ),
+            (playlist_name,),
+        ).fetchall()
+
+    def insert(self, fname: str, index: int):
+        """Insert a track into the playlist.
+
+        :param fname: The file path of the track to insert.
+        :param index: The position to insert the track at.
+            Indices past the end append the track.
+        :raises IndexError: If the index is negative.
+        """
+        if index < 0:
+            raise IndexError(f"playlist entry index {index} out of range")
+        index = min(index, len(self.entries))
+        sort_order = self._get_free_sort_order(index)
+        self.cursor.execute(
+            "INSERT INTO playlists2 VALUES (?, ?, ?, ?, 3)",
+            (self.playlist_name, self.path, fname, sort_order),
+        )
+        self.entries.insert(index, (self.cursor.lastrowid, sort_order))
+
+    def remove(self, index: int):
+        """Remove a track from the playlist.
+
+        The remaining entries keep their order_in_list.
+
+        :param index: The position of the track to remove.
+        :raises IndexError: If there is no track at the given position.
+        """
+        self._check_index(index)
+        rowid = self.entries.pop(index)[0]
+        self.cursor.execute("DELETE FROM playlists2 WHERE rowid=?", (rowid,))
+
+    def move(self, old_index: int, new_index: int):
+        """Move a track to another position in the playlist.
+
+        :param old_index: The current position of the track.
+        :param new_index: The position to move the track to.
+        :raises IndexError: If either position is outside of the playlist.
+        """
+        self._check_index(old_index)
+        self._check_index(new_index)
+        rowid = self.entries.pop(old_index)[0]
+        sort_order = self._get_free_sort_order(new_index)
+        self.cursor.execute(
+            "UPDATE playlists2 SET order_in_list=? WHERE rowid=?", (sort_order, rowid)
+        )
+        self.entries.insert(new_index, (rowid, sort_order))
+
+    def _check_index(self, index: int):
+        if not 0 <= index < len(self.entries):
+            raise IndexError(f"playlist entry index {index} out of range")
+
+    def _get_free_sort_order(self, index: int) -> int:
+        # find an order_in_list between the entries at index - 1 and index,
+        # renumbering the playlist if they're too close together
+        lower = self.entries[index - 1][1] if index > 0 else 0
+        if index == len(self.entries):
+            return lower + ORDER_STEP
+        upper = self.entries[index][1]
+        if upper - lower < 2:
+            self._renumber()
+            lower = self.entries[index - 1][1] if index > 0 else 0
+            upper = self.entries[index][1]
+        return (lower + upper) // 2
+
+    def _renumber(self):
+        self.entries = [
+            (rowid, (i + 1) * ORDER_STEP) for i, (rowid, _) in enumerate(self.entries)
+        ]
+        self.cursor.executemany(
+            "UPDATE playlists2 SET order_in_list=? WHERE rowid=?",
+            [(sort_order, rowid) for rowid, sort_order in self.entries],
+        )
+
+
+def insert_playlist_track(
+    conn: sqlite3.Connection,
+    cursor: sqlite3.Cursor,
+    playlist_name: str,
+    fname: str,
+    index: int,
+):
+    """Insert a track into an existing playlist.
+
+    This reads the whole playlist, use `PlaylistEditor` for many edits.
+
+    :param conn: The connection to execute the query with.
+    :param cursor: The cursor to execute the query with.
+    :param playlist_name: The name of the playlist.
+    :param fname: The file path of the track to insert.
+    :param index: The position to insert the track at.
+        Indices past the end append the track.
+    :raises KeyError: If there is no playlist with the given name.
+    :raises IndexError: If the index is negative.
+    """
+    PlaylistEditor(conn, cursor, playlist_name).insert(fname, index)
+    conn.commit()
+
+
+def remove_playlist_track(
+    conn: sqlite3.Connection, cursor: sqlite3.Cursor, playlist_name: str, index: int
+):
+    """Remove a track from a playlist.
+
+    This reads the whole playlist, use `PlaylistEditor` for many edits.
+
+    :param conn: The connection to execute the query with.
+    :param cursor: The cursor to execute the query with.
+    :param playlist_name: The name of the playlist.
+    :param index: The position of the track to remove.
+    :raises KeyError: If there is no playlist with the given name.
+    :raises IndexError: If there is no track at the given position.
+    """
+    PlaylistEditor(conn, cursor, playlist_name).remove(index)
+    conn.commit()
+
+
+def move_playlist_track(
+    conn: sqlite3.Connection,
+    cursor: sqlite3.Cursor,
+    playlist_name: str,
+    old_index: int,
+    new_index: int,
+):
+    """Move a track to another position in its playlist.
+
+    This reads the whole playlist, use `PlaylistEditor` for many edits.
+
+    :param conn: The connection to execute the query with.
+    :param cursor: The cursor to execute the query with.
+    :param playlist_name: The name of the playlist.
+    :param old_index: The current position of the track.
+    :param new_index: The position to move the track to.
+    :raises KeyError: If there is no playlist with the given name.
+    :raises IndexError: If either position is outside of the playlist.
+    """
+    PlaylistEditor(conn, cursor, playlist_name).move(old_index, new_index)
+    conn.commit()
+
+
 def insert_version_info(conn: sqlite3.Connection, cursor: sqlite3.Cursor):
     """Insert the version info from the test data.
 
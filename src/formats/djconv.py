@@ -0,0 +1,501 @@
+import mmap
+import struct
+import structs
+
+MAGIC = b"DJCV"
+"""The magic bytes every DJConv library file starts with.
+"""
+VERSION = 1
+"""The current version of the DJConv library format.
+"""
+
+_NONE = 0xFFFFFFFF
+"""Placeholder for missing strings and cue points.
+"""
+_COLOR_NULL = 1 << 31
+"""Flag bit marking a cue point without a color.
+"""
+
+# magic, version, reserved, 6 section counts, 6 section offsets
+_HEADER = struct.Struct("<4sHH6I6Q")
+_ENTRY = struct.Struct("<q")
+_SAMPLE = struct.Struct("<I")
+_STRING_OFFSET = struct.Struct("<I")
+
+
+class _RecordLayout:
+    """Layout of a fixed-width record.
+
+    Every record consists of string table indices, numeric fields, extra
+    fields that aren't attributes of the struct and a trailing flags field.
+    Each numeric field owns two bits of the flags: the lower one marks the
+    value as None, the upper one marks a float field as holding an int.
+    """
+
+    def __init__(self, strings: tuple, numbers: tuple, extra: tuple):
+        self.strings = strings
+        self.numbers = numbers
+        self.extra = extra
+        fields = (
+            [(name, "I") for name in strings]
+            + list(numbers)
+            + list(extra)
+            + [("flags", "I")]
+        )
+        self.struct = struct.Struct("<" + "".join(fmt for _, fmt in fields))
+        self.offsets = {}
+        prefix = "<"
+        for name, fmt in fields:
+            self.offsets[name] = (fmt, struct.calcsize(prefix))
+            prefix += fmt
+
+    def encode(self, obj, strings: "_StringTable", extra: tuple, flags: int = 0):
+        """Pack the given struct into a record.
+
+        :param obj: The struct to pack.
+        :param strings: The string table to add the string fields to.
+        :param extra: The values for the extra fields.
+        :param flags: Additional flags to set.
+        :returns: The packed record.
+        """
+        values = [strings.add(getattr(obj, name)) for name in self.strings]
+        for i, (name, fmt) in enumerate(self.numbers):
+            value = getattr(obj, name)
+            if value is None:
+                flags |= 1 << (2 * i)
+                value = 0
+            elif fmt == "d":
+                if isinstance(value, int):
+                    flags |= 1 << (2 * i + 1)
+                value = float(value)
+            else:
+                value = int(value)
+            values.append(value)
+        return self.struct.pack(*values, *extra, flags)
+
+    def decode(self, reader: "DjconvFile", values: tuple) -> tuple[dict, tuple]:
+        """Decode an unpacked record.
+
+        :param reader: The file to look up strings in.
+        :param values: The unpacked record values.
+        :returns: A dict of the struct attributes, as well as
+            a tuple of the extra field values.
+        """
+        flags = values[-1]
+        attrs = {}
+        for name, value in zip(self.strings, values):
+            attrs[name] = reader.string(value)
+        offset = len(self.strings)
+        for i, (name, _) in enumerate(self.numbers):
+            attrs[name] = _decode_number(values[offset + i], flags, i)
+        offset += len(self.numbers)
+        return (attrs, values[offset:-1])
+
+    def index(self, name: str) -> int:
+        """Get the position of the given numeric field.
+
+        :param name: The field name.
+        :returns: The position of the field in `numbers`,
+            or -1 if it isn't a numeric field.
+        """
+        for i, (number, _) in enumerate(self.numbers):
+            if number == name:
+                return i
+        return -1
+
+
+_TRACK = _RecordLayout(
+    (
+        "title",
+        "fname",
+        "artist",
+        "album",
+        "albumartist",
+        "composer",
+        "genre",
+        "release_date",
+        "cover_filepath",
+        "comment",
+        "first_played",
+        "last_played",
+        "last_modified",
+    ),
+    (
+        ("id", "q"),
+        ("bpm", "d"),
+        ("length", "d"),
+        ("first_beat_position", "d"),
+        ("filesize", "q"),
+        ("tracknumber", "i"),
+        ("key", "i"),
+        ("play_count", "i"),
+        ("bitrate", "i"),
+        ("bitdepth", "i"),
+        ("samplerate", "i"),
+    ),
+    (("cue", "I"), ("hot_cue_start", "I"), ("hot_cue_count", "I")),
+)
+_CUE = _RecordLayout(
+    ("name",),
+    (("pos", "d"), ("loopLength", "d"), ("number", "i")),
+    (("color_id", "i"), ("color_hex", "I")),
+)
+_PLAYLIST = _RecordLayout(
+    ("name",),
+    (("sort_order", "i"),),
+    (("entry_start", "I"), ("entry_count", "I")),
+)
+
+
+class _StringTable:
+    """Deduplicating string table used while writing."""
+
+    def __init__(self):
+        self.indices = {}
+        self.strings = []
+
+    def add(self, string: str | None) -> int:
+        """Add a string to the table.
+
+        :param string: The string to add.
+        :returns: The index of the string, or `_NONE` for None.
+        """
+        if string is None:
+            return _NONE
+        string = str(string)
+        if string not in self.indices:
+            self.indices[string] = len(self.strings)
+            self.strings.append(string)
+        return self.indices[string]
+
+
+class DjconvFile:
+    """A memory-mapped DJConv library file.
+
+    Records are only decoded when they are accessed, strings are decoded
+    once and cached afterwards. Indices outside of a section raise an
+    `IndexError`. Use as a context manager or call `close` when done.
+    """
+
+    def __init__(self, fname: str):
+        """Open and validate the given file.
+
+        :param fname: The file name of the DJConv library to read.
+        :raises ValueError: If the file isn't a supported DJConv library
+            or is truncated.
+        """
+        self._file = open(fname, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{fname} is not a DJConv library")
+        if len(self._mm) < _HEADER.size:
+            self.close()
+            raise ValueError(f"{fname} is not a DJConv library")
+        header = _HEADER.unpack_from(self._mm, 0)
+        if header[0] != MAGIC:
+            self.close()
+            raise ValueError(f"{fname} is not a DJConv library")
+        if header[1] > VERSION:
+            self.close()
+            raise ValueError(f"unsupported DJConv library version {header[1]}")
+        (
+            self.track_count,
+            self.cue_count,
+            self.playlist_count,
+            self._entry_count,
+            self.sample_count,
+            self._string_count,
+        ) = header[3:9]
+        (
+            self._tracks_offset,
+            self._cues_offset,
+            self._playlists_offset,
+            self._entries_offset,
+            self._samples_offset,
+            self._strings_offset,
+        ) = header[9:15]
+        self._string_data_offset = self._strings_offset + _STRING_OFFSET.size * (
+            self._string_count + 1
+        )
+        self._string_cache = {}
+
+        # make sure every section lies within the file, so truncated files
+        # are rejected here instead of failing on the first access
+        sections = (
+            (self._tracks_offset, self.track_count, _TRACK.struct.size),
+            (self._cues_offset, self.cue_count, _CUE.struct.size),
+            (self._playlists_offset, self.playlist_count, _PLAYLIST.struct.size),
+            (self._entries_offset, self._entry_count, _ENTRY.size),
+            (self._samples_offset, self.sample_count, _SAMPLE.size),
+            (self._strings_offset, self._string_count + 1, _STRING_OFFSET.size),
+        )
+        for offset, count, size in sections:
+            if offset < _HEADER.size or offset + count * size > len(self._mm):
+                self.close()
+                raise ValueError(f"{fname} is not a DJConv library")
+        string_data_end = _STRING_OFFSET.unpack_from(
+            self._mm, self._strings_offset + _STRING_OFFSET.size * self._string_count
+        )[0]
+        if self._string_data_offset + string_data_end > len(self._mm):
+            self.close()
+            raise ValueError(f"{fname} is not a DJConv library")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Unmap and close the file."""
+        self._mm.close()
+        self._file.close()
+
+    def string(self, index: int) -> str | None:
+        """Get a string from the string table.
+
+        :param index: The index of the string.
+        :returns: The string, or None for `_NONE`.
+        """
+        if index == _NONE:
+            return None
+        if index not in self._string_cache:
+            position = _record_position(
+                self._strings_offset, _STRING_OFFSET.size, index, self._string_count
+            )
+            start = _STRING_OFFSET.unpack_from(self._mm, position)[0]
+            end = _STRING_OFFSET.unpack_from(self._mm, position + 4)[0]
+            self._string_cache[index] = self._mm[
+                self._string_data_offset + start : self._string_data_offset + end
+            ].decode("utf8")
+        return self._string_cache[index]
+
+    def track_field(self, index: int, name: str):
+        """Decode a single field of a track without decoding the whole record.
+
+        :param index: The index of the track.
+        :param name: The name of the `structs.Track` attribute to get.
+        :returns: The attribute's value.
+        """
+        position = _record_position(
+            self._tracks_offset, _TRACK.struct.size, index, self.track_count
+        )
+        fmt, offset = _TRACK.offsets[name]
+        value = struct.unpack_from("<" + fmt, self._mm, position + offset)[0]
+        if name in _TRACK.strings:
+            return self.string(value)
+        number = _TRACK.index(name)
+        if number < 0:
+            return value
+        flags_offset = _TRACK.offsets["flags"][1]
+        flags = struct.unpack_from("<I", self._mm, position + flags_offset)[0]
+        return _decode_number(value, flags, number)
+
+    def cue(self, index: int) -> structs.CuePoint:
+        """Decode a cue point.
+
+        :param index: The index of the cue point.
+        :returns: The cue point.
+        """
+        values = _CUE.struct.unpack_from(
+            self._mm,
+            _record_position(
+                self._cues_offset, _CUE.struct.size, index, self.cue_count
+            ),
+        )
+        attrs, (color_id, color_hex) = _CUE.decode(self, values)
+        if not values[-1] & _COLOR_NULL:
+            attrs["color"] = structs.Color(color_id, self.string(color_hex))
+        return structs.CuePoint(**attrs)
+
+    def track(self, index: int) -> structs.Track:
+        """Decode a track, including its cue points.
+
+        :param index: The index of the track.
+        :returns: The track.
+        """
+        values = _TRACK.struct.unpack_from(
+            self._mm,
+            _record_position(
+                self._tracks_offset, _TRACK.struct.size, index, self.track_count
+            ),
+        )
+        attrs, (cue, hot_cue_start, hot_cue_count) = _TRACK.decode(self, values)
+        attrs["cue"] = self.cue(cue) if cue != _NONE else None
+        attrs["hot_cues"] = [
+            self.cue(i) for i in range(hot_cue_start, hot_cue_start + hot_cue_count)
+        ]
+        return structs.Track(**attrs)
+
+    def playlist(self, index: int) -> structs.Playlist:
+        """Decode a playlist, including its track IDs.
+
+        :param index: The index of the playlist.
+        :returns: The playlist.
+        :raises ValueError: If the playlist's entries lie outside the file.
+        """
+        values = _PLAYLIST.struct.unpack_from(
+            self._mm,
+            _record_position(
+                self._playlists_offset,
+                _PLAYLIST.struct.size,
+                index,
+                self.playlist_count,
+            ),
+        )
+        attrs, (entry_start, entry_count) = _PLAYLIST.decode(self, values)
+        if entry_start + entry_count > self._entry_count:
+            raise ValueError(f"playlist {index} has invalid entries")
+        attrs["track_ids"] = list(
+            struct.unpack_from(
+                f"<{entry_count}q",
+                self._mm,
+                self._entries_offset + _ENTRY.size * entry_start,
+            )
+        )
+        return structs.Playlist(**attrs)
+
+    def sample(self, index: int) -> structs.Sample:
+        """Decode a sample.
+
+        :param index: The index of the sample.
+        :returns: The sample.
+        """
+        (fname,) = _SAMPLE.unpack_from(
+            self._mm,
+            _record_position(
+                self._samples_offset, _SAMPLE.size, index, self.sample_count
+            ),
+        )
+        return structs.Sample(self.string(fname))
+
+    def library(self) -> structs.Library:
+        """Decode the whole library.
+
+        :returns: The library.
+        """
+        return structs.Library(
+            [self.track(i) for i in range(self.track_count)],
+            [self.playlist(i) for i in range(self.playlist_count)],
+            [self.sample(i) for i in range(self.sample_count)],
+        )
+
+
+def parse_db(fname: str) -> structs.Library:
+    """Parse the DJConv library and return the created library.
+
+    The file is memory-mapped, see `DjconvFile` for lazy access
+    to single records.
+
+    :param fname: The file name of the DJConv library to read.
+    """
+    with DjconvFile(fname) as file:
+        return file.library()
+
+
+def write_db(fname: str, library: structs.Library):
+    """Write the library to a DJConv library file.
+
+    See docs/djconv-format.md for the file layout.
+
+    :param fname: The file name of the DJConv library to write.
+    :param library: The library to write.
+    """
+    strings = _StringTable()
+    cues = []
+    tracks = []
+    for track in library.tracks:
+        cue = _NONE
+        if track.cue is not None:
+            cue = len(cues)
+            cues.append(_encode_cue(track.cue, strings))
+        hot_cue_start = len(cues)
+        for hot_cue in track.hot_cues:
+            cues.append(_encode_cue(hot_cue, strings))
+        tracks.append(
+            _TRACK.encode(
+                track, strings, (cue, hot_cue_start, len(track.hot_cues))
+            )
+        )
+
+    playlists = []
+    entries = []
+    for playlist in library.playlists:
+        playlists.append(
+            _PLAYLIST.encode(
+                playlist, strings, (len(entries), len(playlist.track_ids))
+            )
+        )
+        entries.extend(_ENTRY.pack(track_id) for track_id in playlist.track_ids)
+
+    samples = [_SAMPLE.pack(strings.add(sample.fname)) for sample in library.samples]
+
+    string_data = [string.encode("utf8") for string in strings.strings]
+    string_offsets = [0]
+    for data in string_data:
+        string_offsets.append(string_offsets[-1] + len(data))
+
+    sections = [
+        b"".join(tracks),
+        b"".join(cues),
+        b"".join(playlists),
+        b"".join(entries),
+        b"".join(samples),
+        b"".join(_STRING_OFFSET.pack(offset) for offset in string_offsets)
+        + b"".join(string_data),
+    ]
+    offsets = []
+    position = _HEADER.size
+    for section in sections:
+        position = _align(position)
+        offsets.append(position)
+        position += len(section)
+
+    with open(fname, "wb") as file:
+        file.write(
+            _HEADER.pack(
+                MAGIC,
+                VERSION,
+                0,
+                len(tracks),
+                len(cues),
+                len(playlists),
+                len(entries),
+                len(samples),
+                len(string_data),
+                *offsets,
+            )
+        )
+        position = _HEADER.size
+        for offset, section in zip(offsets, sections):
+            file.write(b"\0" * (offset - position))
+            file.write(section)
+            position = offset + len(section)
+
+
+def _encode_cue(cue: structs.CuePoint, strings: _StringTable) -> bytes:
+    if cue.color is None:
+        return _CUE.encode(cue, strings, (0, _NONE), _COLOR_NULL)
+    return _CUE.encode(cue, strings, (cue.color.id, strings.add(cue.color.hex_code)))
+
+
+def _decode_number(value, flags: int, index: int):
+    if flags & (1 << (2 * index)):
+        return None
+    if flags & (1 << (2 * index + 1)):
+        return int(value)
+    return value
+
+
+def _record_position(offset: int, size: int, index: int, count: int) -> int:
+    # without this check, indices past the end would silently decode
+    # whatever the next section contains
+    if not 0 <= index < count:
+        raise IndexError(f"record index {index} out of range")
+    return offset + size * index
+
+
+def _align(position: int) -> int:
+    return (position + 7) & ~7
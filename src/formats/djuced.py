@@ -1,7 +1,10 @@
+import contextlib
 import sqlite3
 import structs
+from typing import Callable, Iterator
 from formats._djuced import (
     create_indices,
+    create_snapshot,
     create_tables,
     get_starts,
     get_cues,
@@ -12,11 +15,16 @@ from formats._djuced import (
     insert_playlists,
     insert_samples,
     insert_tracks,
-    insert_version_info
+    insert_version_info,
+    PlaylistEditor,
 )
 
 
-def parse_db(fname: str) -> structs.Library:
+def parse_db(
+    fname: str,
+    snapshot: bool = False,
+    progress: Callable[[int, int, int], object] | None = None,
+) -> structs.Library:
     """Parse the DJUCED database and return the created library.
     
     Some database fields are ignored as we don't know their use:
@@ -35,11 +43,24 @@ def parse_db(fname: str) -> structs.Library:
     - Party playlists
     - Recordings
     - tblAdmin, tblFolderScan
+
+    All tables are read in a single read transaction, so changes DJUCED
+    makes while parsing don't lead to an inconsistent library. As this
+    blocks DJUCED from writing until parsing is finished, `snapshot` can
+    be used to parse an in-memory copy of the database instead.
     
     :param fname: The file name of the DJUCED database to read.
+    :param snapshot: Whether to parse a snapshot of the database,
+        see `create_snapshot`.
+    :param progress: Progress callback for creating the snapshot,
+        see `create_snapshot`.
     """
-    conn = sqlite3.connect(fname)
+    if snapshot:
+        conn = create_snapshot(fname, progress)
+    else:
+        conn = sqlite3.connect(fname)
     cursor = conn.cursor()
+    cursor.execute("BEGIN")
 
     starts = get_starts(cursor)
 
@@ -52,7 +73,8 @@ def parse_db(fname: str) -> structs.Library:
     playlists = get_playlists(cursor, playlist_track_ids)
 
     samples = get_samples(cursor)
-    
+
+    conn.commit()
     conn.close()
 
     return structs.Library(tracks, playlists, samples)
@@ -76,3 +98,30 @@ def write_db(fname: str, library: structs.Library):
     create_indices(cursor)
     
     conn.close()
+
+
+@contextlib.contextmanager
+def edit_playlist(fname: str, playlist_name: str) -> Iterator[PlaylistEditor]:
+    """Edit a playlist of an existing DJUCED database.
+
+    All edits are written in one transaction, which is committed when the
+    block ends and rolled back if it raises::
+
+        with edit_playlist("DJUCED.db", "Warmup") as editor:
+            editor.insert("D:/music/track.mp3", 0)
+            editor.move(3, 1)
+
+    :param fname: The file name of the DJUCED database to edit.
+    :param playlist_name: The name of the playlist to edit.
+    :raises KeyError: If there is no playlist with the given name.
+    """
+    conn = sqlite3.connect(fname)
+    try:
+        editor = PlaylistEditor(conn, conn.cursor(), playlist_name)
+        yield editor
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
@@ -0,0 +1,282 @@
+import argparse
+import dataclasses
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import formats
+import structs
+from formats._djuced import COLORS
+from typing import List
+
+STARTUP_BUDGET_MS = 50
+"""How long DJConv may take to reach the point of loading the input format.
+"""
+STARTUP_RUNS = 11
+"""How often to start DJConv when checking the startup budget.
+"""
+
+
+def generate_library(track_count: int, seed: int) -> structs.Library:
+    """Generate a random library.
+
+    Values are limited to what every format can store, e.g. release dates
+    only contain a year, cue points use DJUCED's default colors and
+    bitdepth is left out.
+
+    :param track_count: The number of tracks to generate.
+    :param seed: The seed for the random number generator.
+    :returns: The generated library.
+    """
+    rng = random.Random(seed)
+
+    def text() -> str:
+        return "".join(
+            rng.choice("abcdefgh ÄÖÜéß-_") for _ in range(rng.randint(1, 20))
+        )
+
+    tracks = []
+    for i in range(track_count):
+        fname = f"D:/music/{text()}/{i}.{rng.choice(('mp3', 'wav', 'flac'))}"
+        hot_cues = [
+            structs.CuePoint(
+                pos=rng.uniform(0, 600),
+                name=f"Cue {number}",
+                number=number,
+                color=COLORS[0],
+                loopLength=rng.choice((0, rng.uniform(0, 16))),
+            )
+            for number in rng.sample(range(1, 9), rng.randint(0, 8))
+        ]
+        tracks.append(
+            structs.Track(
+                id=i + 1,
+                title=text(),
+                fname=fname,
+                artist=text(),
+                album=text(),
+                albumartist=text(),
+                composer=text(),
+                tracknumber=rng.randint(1, 20),
+                genre=rng.choice(("Metal", "House", "Techno", "Pop")),
+                release_date=f"{rng.randint(1950, 2030)}-01-01",
+                cover_filepath=text(),
+                comment=text(),
+                bpm=rng.uniform(60, 200),
+                key=rng.randint(0, 23),
+                length=rng.randint(60, 1200),
+                first_beat_position=rng.uniform(0, 2),
+                play_count=rng.randint(0, 100),
+                first_played="2023-01-01T12:00:00",
+                last_played="2024-06-30T23:59:59",
+                bitrate=rng.choice((128, 192, 320)),
+                samplerate=rng.choice((44100, 48000)),
+                filesize=rng.randint(1_000_000, 100_000_000),
+                last_modified="2022-12-24T18:00:00",
+                hot_cues=hot_cues,
+                cue=(
+                    structs.CuePoint(
+                        pos=rng.uniform(0, 600),
+                        name="Cue 0",
+                        number=0,
+                        color=COLORS[4],
+                    )
+                    if rng.random() < 0.8
+                    else None
+                ),
+            )
+        )
+
+    playlists = [
+        structs.Playlist(
+            name=f"{text()} {i}",
+            sort_order=i,
+            track_ids=[
+                rng.randint(1, track_count)
+                for _ in range(rng.randint(0, min(track_count, 500)))
+            ],
+        )
+        for i in range(max(1, track_count // 100))
+    ]
+    samples = [
+        structs.Sample(f"D:/samples/{i}.wav") for i in range(rng.randint(0, 20))
+    ]
+    return structs.Library(tracks, playlists, samples)
+
+
+def count_rows(library: structs.Library) -> int:
+    """Count the tracks, cue points, playlist entries and samples of a library.
+
+    :param library: The library to count the rows of.
+    """
+    rows = len(library.samples)
+    for track in library.tracks:
+        rows += 1 + len(track.hot_cues) + (track.cue is not None)
+    for playlist in library.playlists:
+        rows += 1 + len(playlist.track_ids)
+    return rows
+
+
+def diff_libraries(expected, actual, path: str = "library") -> List[str]:
+    """Compare two libraries field by field.
+
+    Floats are compared with a relative tolerance of 1e-9.
+
+    :param expected: The original library, or a part of it.
+    :param actual: The library after the round trip, or a part of it.
+    :param path: The name of the compared value, used in the differences.
+    :returns: A description of each difference.
+    """
+    if dataclasses.is_dataclass(expected) and type(expected) is type(actual):
+        differences = []
+        for field in dataclasses.fields(expected):
+            differences += diff_libraries(
+                getattr(expected, field.name),
+                getattr(actual, field.name),
+                f"{path}.{field.name}",
+            )
+        return differences
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return [f"{path}: expected {len(expected)} items, got {len(actual)}"]
+        differences = []
+        for i, (expected_item, actual_item) in enumerate(zip(expected, actual)):
+            differences += diff_libraries(expected_item, actual_item, f"{path}[{i}]")
+        return differences
+    if isinstance(expected, float) and isinstance(actual, (int, float)):
+        if math.isclose(expected, actual, rel_tol=1e-9):
+            return []
+    elif expected == actual:
+        return []
+    return [f"{path}: expected {expected!r}, got {actual!r}"]
+
+
+def run_path(library: structs.Library, path: List[str], directory: str):
+    """Write the library to and read it back from each format in order.
+
+    :param library: The library to start with.
+    :param path: The format names to convert through.
+    :param directory: The directory to write the files to.
+    :returns: The library after the last conversion and the time it took,
+        or None if one of the formats can't be read.
+    """
+    start = time.perf_counter()
+    for i, format_name in enumerate(path):
+        fname = os.path.join(directory, f"{i}-{format_name}")
+        formats.get_writer(format_name)(fname, library)
+        library = formats.get_parser(format_name)(fname)
+        if library is None:
+            return None
+    return (library, time.perf_counter() - start)
+
+
+def measure_startup() -> float:
+    """Measure how long DJConv takes to start and validate its arguments,
+    right before it would load the input format.
+
+    :returns: The median time of `STARTUP_RUNS` runs, in milliseconds.
+    """
+    main = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__main__.py")
+    durations = []
+    for _ in range(STARTUP_RUNS):
+        start = time.perf_counter()
+        # without an output format, DJConv exits before loading any format
+        subprocess.run(
+            [sys.executable, main, "input", "-if", "djuced"], capture_output=True
+        )
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def positive_int(value: str) -> int:
+    """Parse a command line argument that must be at least 1.
+
+    :param value: The argument.
+    :raises argparse.ArgumentTypeError: If the argument is less than 1.
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+parser = argparse.ArgumentParser(
+    description=(
+        "Round-trip randomly generated libraries through every pair of "
+        "formats and check that no data is lost or changed."
+    )
+)
+parser.add_argument("-t", "--tracks", type=int, default=10000)
+parser.add_argument("-s", "--seed", type=int, default=0)
+parser.add_argument("-b", "--baseline")
+parser.add_argument("--saveBaseline", action="store_true")
+parser.add_argument("-r", "--repeat", type=positive_int, default=3)
+parser.add_argument("--threshold", type=float, default=0.2)
+parser.add_argument(
+    "--startupBudget", type=float, nargs="?", const=STARTUP_BUDGET_MS
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.saveBaseline and not args.baseline:
+        print("--saveBaseline requires --baseline!")
+        exit(1)
+    if args.startupBudget is not None:
+        startup = measure_startup()
+        print(f"startup: {startup:.0f} ms, budget {args.startupBudget:.0f} ms")
+        if startup > args.startupBudget:
+            print("  startup budget exceeded")
+            exit(1)
+        exit(0)
+
+    library = generate_library(args.tracks, args.seed)
+    rows = count_rows(library)
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline) and not args.saveBaseline:
+        with open(args.baseline, encoding="utf8") as file:
+            baseline = json.load(file)
+
+    results = {}
+    failed = False
+    format_names = formats.available_formats()
+    for first in format_names:
+        for second in format_names:
+            path = [first] if first == second else [first, second]
+            name = " -> ".join(path)
+            # use the fastest of several runs to reduce noise
+            durations = []
+            for _ in range(args.repeat):
+                with tempfile.TemporaryDirectory() as directory:
+                    result = run_path(library, path, directory)
+                if result is None:
+                    break
+                durations.append(result[1])
+            if result is None:
+                print(f"{name}: skipped, reading is not supported")
+                continue
+            differences = diff_libraries(library, result[0])
+            results[name] = rows / min(durations)
+            print(f"{name}: {results[name]:.0f} rows/s")
+            if differences:
+                failed = True
+                print(f"  {len(differences)} differences, e.g.:")
+                for difference in differences[:10]:
+                    print(f"  {difference}")
+            if name in baseline and results[name] < baseline[name] * (
+                1 - args.threshold
+            ):
+                failed = True
+                print(
+                    f"  throughput regression: baseline was {baseline[name]:.0f} rows/s"
+                )
+
+    if args.saveBaseline:
+        with open(args.baseline, "w", encoding="utf8") as file:
+            json.dump(results, file, indent=4)
+    if failed:
+        exit(1)
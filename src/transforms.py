@@ -0,0 +1,207 @@
+import numpy
+import structs
+from dataclasses import dataclass, field
+from typing import Callable, List, Sequence
+
+MS_TO_SECONDS = 0.001
+"""Factor for `scale_positions` to convert milliseconds to seconds.
+"""
+SECONDS_TO_MS = 1000
+"""Factor for `scale_positions` to convert seconds to milliseconds.
+"""
+
+
+@dataclass
+class LibraryArrays:
+    """The numeric track and cue point data of a library as arrays.
+
+    Missing values are stored as NaN, missing keys as -1. Transforms add
+    the names of the arrays they change to `modified`, only those are
+    written back.
+    """
+
+    tracks: List[structs.Track]
+    cues: List[structs.CuePoint]
+    # index of the track each cue point belongs to
+    cue_tracks: numpy.ndarray
+    cue_pos: numpy.ndarray
+    cue_loop_length: numpy.ndarray
+    bpm: numpy.ndarray
+    first_beat_position: numpy.ndarray
+    key: numpy.ndarray
+    # which tracks have a key of None, so it can be written back as None
+    key_missing: numpy.ndarray
+    modified: set = field(default_factory=set)
+
+
+Transform = Callable[[LibraryArrays], None]
+
+
+def apply_transforms(library: structs.Library, transforms: Sequence[Transform]):
+    """Apply the given transforms to all tracks and cue points of the library.
+
+    The library's data is read into arrays once, all transforms are applied
+    to the arrays in order and the results are written back in one pass.
+
+    :param library: The library to transform in place.
+    :param transforms: The transforms to apply, for example `offset_positions`.
+    """
+    arrays = read_arrays(library)
+    for transform in transforms:
+        transform(arrays)
+    write_arrays(arrays)
+
+
+def read_arrays(library: structs.Library) -> LibraryArrays:
+    """Read the numeric data of the library into arrays.
+
+    :param library: The library to read.
+    :returns: The library's data as arrays.
+    """
+    cues = []
+    cue_tracks = []
+    for i, track in enumerate(library.tracks):
+        if track.cue is not None:
+            cues.append(track.cue)
+            cue_tracks.append(i)
+        cues.extend(track.hot_cues)
+        cue_tracks.extend([i] * len(track.hot_cues))
+
+    return LibraryArrays(
+        tracks=library.tracks,
+        cues=cues,
+        cue_tracks=numpy.array(cue_tracks, dtype=numpy.intp),
+        cue_pos=_to_array([cue.pos for cue in cues]),
+        cue_loop_length=_to_array([cue.loopLength for cue in cues]),
+        bpm=_to_array([track.bpm for track in library.tracks]),
+        first_beat_position=_to_array(
+            [track.first_beat_position for track in library.tracks]
+        ),
+        key=numpy.array(
+            [track.key if track.key is not None else -1 for track in library.tracks],
+            dtype=numpy.intp,
+        ),
+        key_missing=numpy.array(
+            [track.key is None for track in library.tracks], dtype=bool
+        ),
+    )
+
+
+def write_arrays(arrays: LibraryArrays):
+    """Write the modified arrays back to their tracks and cue points.
+
+    :param arrays: The arrays to write back.
+    """
+    if "cue_pos" in arrays.modified:
+        for cue, value in zip(arrays.cues, _from_array(arrays.cue_pos)):
+            cue.pos = value
+    if "cue_loop_length" in arrays.modified:
+        for cue, value in zip(arrays.cues, _from_array(arrays.cue_loop_length)):
+            cue.loopLength = value
+    if "bpm" in arrays.modified:
+        for track, value in zip(arrays.tracks, _from_array(arrays.bpm)):
+            track.bpm = value
+    if "first_beat_position" in arrays.modified:
+        for track, value in zip(
+            arrays.tracks, _from_array(arrays.first_beat_position)
+        ):
+            track.first_beat_position = value
+    if "key" in arrays.modified:
+        for track, value, missing in zip(
+            arrays.tracks, arrays.key.tolist(), arrays.key_missing.tolist()
+        ):
+            track.key = value if not missing else None
+    arrays.modified.clear()
+
+
+def offset_positions(seconds: float) -> Transform:
+    """Shift all cue points and first beats, e.g. to correct for
+    different decoder delays between programs.
+
+    :param seconds: The offset to add, may be negative.
+    """
+
+    def transform(arrays: LibraryArrays):
+        arrays.cue_pos += seconds
+        arrays.first_beat_position += seconds
+        arrays.modified.update(("cue_pos", "first_beat_position"))
+
+    return transform
+
+
+def scale_positions(factor: float) -> Transform:
+    """Scale all cue points, loop lengths and first beats,
+    e.g. to convert between seconds and milliseconds.
+
+    :param factor: The factor to multiply with,
+        see `MS_TO_SECONDS` and `SECONDS_TO_MS`.
+    """
+
+    def transform(arrays: LibraryArrays):
+        arrays.cue_pos *= factor
+        arrays.cue_loop_length *= factor
+        arrays.first_beat_position *= factor
+        arrays.modified.update(("cue_pos", "cue_loop_length", "first_beat_position"))
+
+    return transform
+
+
+def quantize_loops() -> Transform:
+    """Round loop lengths to the nearest power of two beats of their track,
+    e.g. 1/2, 1, 2 or 4 beats.
+
+    Loops of tracks without a BPM are left unchanged.
+    """
+
+    def transform(arrays: LibraryArrays):
+        bpm = arrays.bpm[arrays.cue_tracks]
+        loops = (arrays.cue_loop_length > 0) & (bpm > 0)
+        beats = arrays.cue_loop_length[loops] * bpm[loops] / 60
+        beats = numpy.exp2(numpy.round(numpy.log2(beats)))
+        arrays.cue_loop_length[loops] = beats * 60 / bpm[loops]
+        arrays.modified.add("cue_loop_length")
+
+    return transform
+
+
+def round_bpm(decimals: int = 0) -> Transform:
+    """Round all BPMs.
+
+    :param decimals: The number of decimal places to round to.
+    """
+
+    def transform(arrays: LibraryArrays):
+        numpy.round(arrays.bpm, decimals, out=arrays.bpm)
+        arrays.modified.add("bpm")
+
+    return transform
+
+
+def remap_keys(mapping: Sequence[int]) -> Transform:
+    """Map all keys to another key notation.
+
+    Tracks without a key, or with a key that has no entry in `mapping`,
+    e.g. DJUCED's -1 for unknown keys, are left unchanged.
+
+    :param mapping: The new key for each old key, indexed by the old key.
+    """
+
+    def transform(arrays: LibraryArrays):
+        keys = numpy.asarray(mapping, dtype=numpy.intp)
+        # numpy would index negative keys from the end, exclude them
+        mapped = (arrays.key >= 0) & (arrays.key < len(keys))
+        arrays.key[mapped] = keys[arrays.key[mapped]]
+        arrays.modified.add("key")
+
+    return transform
+
+
+def _to_array(values: list) -> numpy.ndarray:
+    return numpy.array(
+        [value if value is not None else numpy.nan for value in values],
+        dtype=numpy.float64,
+    )
+
+
+def _from_array(array: numpy.ndarray) -> list:
+    return [value if value == value else None for value in array.tolist()]
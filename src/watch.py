@@ -0,0 +1,287 @@
+import os
+import pathlib
+import sqlite3
+import tempfile
+import time
+import formats
+import structs
+from formats._djuced import (
+    create_snapshot,
+    cues_from_rows,
+    playlist_tracks_from_rows,
+    playlists_from_rows,
+    samples_from_rows,
+    starts_from_rows,
+    track_from_row,
+)
+from typing import Callable
+
+
+class FileSource:
+    """Watches a library file by its modification time and reparses
+    the whole file on change.
+    """
+
+    def __init__(self, fname: str, parse: Callable[[str], structs.Library]):
+        """:param fname: The file name of the library to watch.
+        :param parse: The function to parse the library with.
+        """
+        self.fname = fname
+        self.parse = parse
+        self.state = None
+
+    def changed(self) -> bool:
+        """Check whether the file changed since the last call."""
+        state = _file_state(self.fname)
+        changed = state != self.state
+        self.state = state
+        return changed
+
+    def read(self) -> structs.Library:
+        """Parse the library."""
+        return self.parse(self.fname)
+
+    def close(self):
+        pass
+
+
+class DjucedSource:
+    """Watches a DJUCED database.
+
+    Keeps a connection to the database open and uses `PRAGMA data_version`
+    as well as the modification times of the database and its WAL file to
+    detect changes. The parsed tracks are kept in memory, only tracks whose
+    rows, beats or cues changed are recreated on refresh.
+    """
+
+    def __init__(self, fname: str, snapshot: bool = False):
+        """:param fname: The file name of the DJUCED database to watch.
+        :param snapshot: Whether to read from a snapshot of the database
+            instead of holding a read transaction on it while reading,
+            see `formats._djuced.create_snapshot`.
+        """
+        self.fname = fname
+        self.snapshot = snapshot
+        self.conn = None
+        self.file_id = None
+        self.state = None
+        # rows, starts, cues and hot cues of each track with the created
+        # Track model, indexed by the track file path
+        self.tracks = {}
+        # rows of each other table with the data read from them
+        self.tables = {}
+
+    def changed(self) -> bool:
+        """Check whether the database changed since the last call."""
+        files = (_file_state(self.fname), _file_state(self.fname + "-wal"))
+        file_id = files[0][:2] if files[0] is not None else None
+        if self.conn is None or file_id != self.file_id:
+            # the database file was replaced, reconnect
+            self.close()
+            self.conn = sqlite3.connect(
+                pathlib.Path(self.fname).absolute().as_uri() + "?mode=ro", uri=True
+            )
+            self.file_id = file_id
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        state = (files, data_version)
+        changed = state != self.state
+        self.state = state
+        return changed
+
+    def read(self) -> structs.Library:
+        """Read the database in a single read transaction,
+        reusing unchanged tracks.
+        """
+        if self.conn is None:
+            raise sqlite3.OperationalError(f"{self.fname} couldn't be opened")
+        conn = create_snapshot(self.fname) if self.snapshot else self.conn
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            try:
+                return self._read_library(cursor)
+            finally:
+                # end the read transaction even if reading failed,
+                # otherwise the next BEGIN on this connection fails
+                conn.rollback()
+        finally:
+            if self.snapshot:
+                conn.close()
+
+    def _read_library(self, cursor: sqlite3.Cursor) -> structs.Library:
+        starts = self._parse_rows(
+            "trackBeats",
+            cursor.execute("SELECT * FROM trackBeats").fetchall(),
+            starts_from_rows,
+        )
+        cues, hot_cues = self._parse_rows(
+            "trackCues",
+            cursor.execute("SELECT * FROM trackCues").fetchall(),
+            cues_from_rows,
+        )
+
+        # select NULL instead of the waveform, so the rows kept for comparison
+        # stay small while their columns still line up with track_from_row
+        columns = [
+            column[1] for column in cursor.execute("PRAGMA table_info(tracks)")
+        ]
+        tracks_query = "SELECT {} FROM tracks".format(
+            ", ".join(
+                "NULL" if column == "waveform" else f'"{column}"' for column in columns
+            )
+        )
+        tracks = []
+        track_ids = {}
+        cached_tracks = {}
+        for row in cursor.execute(tracks_query):
+            fname = row[16]
+            source = (row, starts.get(fname), cues.get(fname), hot_cues.get(fname))
+            cached = self.tracks.get(fname)
+            if cached is not None and cached[0] == source:
+                track = cached[1]
+            else:
+                track = track_from_row(row, starts, hot_cues, cues)
+            cached_tracks[fname] = (source, track)
+            track_ids[fname] = row[0]
+            tracks.append(track)
+        self.tracks = cached_tracks
+
+        playlists = self._parse_rows(
+            "playlists2",
+            cursor.execute(
+                "SELECT * FROM playlists2 ORDER BY order_in_list, rowid"
+            ).fetchall(),
+            lambda rows: playlists_from_rows(
+                [row for row in rows if row[4] == 0],
+                playlist_tracks_from_rows(
+                    [row for row in rows if row[4] == 3], track_ids
+                ),
+            ),
+            track_ids,
+        )
+        samples = self._parse_rows(
+            "samples",
+            cursor.execute("SELECT * FROM samples").fetchall(),
+            samples_from_rows,
+        )
+        return structs.Library(tracks, playlists, samples)
+
+    def _parse_rows(self, table: str, rows: list, parse: Callable, *dependencies):
+        # only convert the table's rows again if they or the data they're
+        # combined with changed
+        key = (rows, dependencies)
+        cached = self.tables.get(table)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        result = parse(rows)
+        self.tables[table] = (key, result)
+        return result
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def watch(
+    input_fname: str,
+    input_format: str,
+    output_fname: str,
+    output_format: str,
+    interval: float = 1,
+    debounce: float = 2,
+    snapshot: bool = False,
+):
+    """Convert the input library and keep converting it whenever it changes,
+    until interrupted.
+
+    Changes are only converted once the input hasn't changed for `debounce`
+    seconds, so a burst of writes only leads to one conversion. The output
+    is written to a temporary file first and then renamed, so readers never
+    see a partially written file.
+
+    Any error while checking for changes or converting, e.g. because DJUCED
+    is writing to the database or the input is only partially written, is
+    printed and retried after `interval`. The output is left as it is until
+    a conversion succeeds again. Only an interrupt stops watching.
+
+    :param input_fname: The file name of the library to watch.
+    :param input_format: The format of the library to watch.
+    :param output_fname: The file name to write the converted library to.
+    :param output_format: The format to convert to.
+    :param interval: The time between checks for changes, in seconds.
+    :param debounce: The time without changes to wait for, in seconds.
+    :param snapshot: Whether to read DJUCED databases from a snapshot,
+        see `DjucedSource`.
+    """
+    if input_format == "djuced":
+        source = DjucedSource(input_fname, snapshot)
+    else:
+        source = FileSource(input_fname, formats.get_parser(input_format))
+    write = formats.get_writer(output_format)
+
+    try:
+        _check_changed(source)
+        pending = True
+        last_change = None
+        while True:
+            if pending and (
+                last_change is None or time.monotonic() - last_change >= debounce
+            ):
+                pending = not _update(source, output_fname, write)
+            time.sleep(interval)
+            if _check_changed(source):
+                pending = True
+                last_change = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.close()
+
+
+def _check_changed(source: FileSource | DjucedSource) -> bool:
+    try:
+        return source.changed()
+    except Exception as error:
+        # the watcher has to keep running, whatever the input looks like
+        print(f"Failed to check {source.fname} for changes: {error}")
+        return False
+
+
+def _update(
+    source: FileSource | DjucedSource, output_fname: str, write: Callable
+) -> bool:
+    start = time.perf_counter()
+    try:
+        _write_atomic(output_fname, write, source.read())
+    except Exception as error:
+        # e.g. a KeyError for a playlist entry whose track isn't written yet
+        print(f"Failed to update {output_fname}, retrying: {error}")
+        return False
+    duration = (time.perf_counter() - start) * 1000
+    print(f"Updated {output_fname} in {duration:.0f} ms")
+    return True
+
+
+def _file_state(fname: str) -> tuple | None:
+    try:
+        stat = os.stat(fname)
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _write_atomic(fname: str, write: Callable, library: structs.Library):
+    directory = os.path.dirname(os.path.abspath(fname))
+    fd, temp_fname = tempfile.mkstemp(dir=directory, prefix=".djconv-")
+    os.close(fd)
+    # mkstemp only allows the owner to read the file, use the usual permissions
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temp_fname, 0o666 & ~umask)
+    try:
+        write(temp_fname, library)
+        os.replace(temp_fname, fname)
+    except BaseException:
+        os.remove(temp_fname)
+        raise